@@ -2,23 +2,31 @@
 import pandas as pd
 
 # 读取预测结果和真实标签
-df_pred = pd.read_csv('dataset_annotation.tsv', sep='\t')
-df_true = pd.read_csv('meta.txt', sep='\t')
+df_pred = pd.read_csv('dataset_annotation.tsv', sep='\t',
+                      dtype={'HLA': 'category', 'Scenario': 'category', 'Disease': 'category'})
+df_true = pd.read_csv('meta.txt', sep='\t',
+                      dtype={'HLA(I/II)': 'category', '分析场景': 'category', '疾病类型': 'category'})
 df_true.columns = ['all_accession', 'HLA_true', 'Scenario_true', 'Disease_true']
 df_compare = pd.merge(df_pred, df_true, on='all_accession')
 
+# 预测列和真实列使用相同的类别集合，比较时只需对比整数编码
+for col in ['HLA', 'Scenario', 'Disease']:
+    categories = df_compare[col].cat.categories.union(df_compare[f'{col}_true'].cat.categories)
+    df_compare[col] = df_compare[col].cat.set_categories(categories)
+    df_compare[f'{col}_true'] = df_compare[f'{col}_true'].cat.set_categories(categories)
+
 # 显示非Unspecified的预测结果
 non_unspec = df_compare[df_compare['HLA'] != 'Unspecified']
 print('成功分类的数据集:')
-for _, row in non_unspec.iterrows():
-    print(f'{row["all_accession"]}: {row["HLA"]} vs {row["HLA_true"]}, {row["Scenario"]} vs {row["Scenario_true"]}, {row["Disease"]} vs {row["Disease_true"]}')
+for row in non_unspec.itertuples(index=False):
+    print(f'{row.all_accession}: {row.HLA} vs {row.HLA_true}, {row.Scenario} vs {row.Scenario_true}, {row.Disease} vs {row.Disease_true}')
 
 print(f'\n成功获取API数据的数据集数量: {len(non_unspec)}/83')
 
 # 计算准确率
-accuracy_hla = (df_compare['HLA'] == df_compare['HLA_true']).mean()
-accuracy_scenario = (df_compare['Scenario'] == df_compare['Scenario_true']).mean()
-accuracy_disease = (df_compare['Disease'] == df_compare['Disease_true']).mean()
+accuracy_hla = (df_compare['HLA'].values == df_compare['HLA_true'].values).mean()
+accuracy_scenario = (df_compare['Scenario'].values == df_compare['Scenario_true'].values).mean()
+accuracy_disease = (df_compare['Disease'].values == df_compare['Disease_true'].values).mean()
 
 print(f'\n总体准确率:')
 print(f'HLA准确率: {accuracy_hla:.2%}')
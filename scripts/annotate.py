@@ -4,130 +4,138 @@ HLA Dataset Annotation Script
 Automatically classifies proteomics datasets by HLA class, analysis scenario, and disease type.
 """
 
-import re
 import csv
-import yaml
+import orjson
+import numpy as np
 import pandas as pd
 import requests
-import joblib
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from pathlib import Path
 from tqdm import tqdm
-import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from annotation_utils import ProjectCache, throttle, load_compiled, match_matrix, first_match
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Setup cache
-mem = joblib.Memory(".cache", verbose=0)
+# Shared HTTP session: reuses TLS connections to PRIDE across fetch threads and
+# retries transient server errors. Each fetch worker may hold two connections
+# (project + samples), so the pool is twice the worker count.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=20,
+    pool_maxsize=40,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[500, 502, 503, 504]),
+))
+
+# Samples requests run alongside their project request, one worker per fetch worker
+SAMPLES_EXECUTOR = ThreadPoolExecutor(max_workers=20)
+
+# PRIDE JSON cache, shared by all fetch threads
+CACHE = ProjectCache(Path(".cache") / "pride_projects_samples.sqlite")
 
-@mem.cache
 def fetch_json(acc):
     """Fetch project and sample metadata from PRIDE API with caching."""
+    cached = CACHE.get(acc)
+    if cached is not None:
+        return tuple(cached)
+    
     base = "https://www.ebi.ac.uk/pride/ws/archive/v2/projects"
+    
+    def get_json(url):
+        throttle()
+        response = SESSION.get(url, timeout=15)
+        response.raise_for_status()
+        return orjson.loads(response.content)
+    
     try:
         logger.info(f"Fetching data for {acc}")
-        proj_response = requests.get(f"{base}/{acc}", timeout=15)
-        proj_response.raise_for_status()
-        proj = proj_response.json()
-        
-        samp_response = requests.get(f"{base}/{acc}/samples", timeout=15)
-        samp_response.raise_for_status()
-        samp = samp_response.json()
-        
-        # Add small delay to be respectful to API
-        time.sleep(0.1)
-        return proj, samp
-    except requests.exceptions.RequestException as e:
+        # The project and samples endpoints are independent; request them in parallel
+        samp_future = SAMPLES_EXECUTOR.submit(get_json, f"{base}/{acc}/samples")
+        try:
+            proj = get_json(f"{base}/{acc}")
+        except Exception:
+            samp_future.cancel()  # samples are not needed any more; one already running is ignored
+            raise
+        samp = samp_future.result()
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
         logger.warning(f"Failed to fetch data for {acc}: {e}")
         return None, None
+    
+    CACHE.put(acc, (proj, samp))
+    return proj, samp
 
 def build_text(proj, samp):
     """Build searchable text from project and sample metadata."""
     if not proj:
         return ""
     
-    fields = [
-        proj.get("projectTitle", ""),
-        proj.get("projectDescription", ""),
-        " ".join(proj.get("keywords", [])),
-        " ".join(attr.get("value", "") for attr in proj.get("additionalAttributes", [])),
-    ]
-    
-    if samp:
-        if isinstance(samp, list):
-            for sample in samp:
-                if isinstance(sample, dict):
-                    # Handle different sample attribute formats
-                    if "attributes" in sample:
-                        if isinstance(sample["attributes"], str):
-                            fields.append(sample["attributes"])
-                        elif isinstance(sample["attributes"], list):
-                            fields.extend([attr.get("value", "") for attr in sample["attributes"]])
-                    
-                    # Handle additional sample fields
-                    for key in ["sampleDescription", "characteristics"]:
-                        if key in sample:
-                            if isinstance(sample[key], str):
-                                fields.append(sample[key])
-                            elif isinstance(sample[key], list):
-                                fields.extend([str(item) for item in sample[key]])
-    
-    return " ".join(str(field) for field in fields if field).lower()
-
-def load_patterns(file_path):
-    """Load regex patterns from YAML file."""
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return yaml.safe_load(f)
-    except FileNotFoundError:
-        logger.error(f"Pattern file not found: {file_path}")
-        return {}
+    def fields():
+        """Yield searchable fields one at a time instead of materializing a list."""
+        yield proj.get("projectTitle", "")
+        yield proj.get("projectDescription", "")
+        yield " ".join(proj.get("keywords", []))
+        yield " ".join(attr.get("value", "") for attr in proj.get("additionalAttributes", []))
+        
+        if not isinstance(samp, list):
+            return
+        for sample in samp:
+            if not isinstance(sample, dict):
+                continue
+            # Handle different sample attribute formats
+            if "attributes" in sample:
+                if isinstance(sample["attributes"], str):
+                    yield sample["attributes"]
+                elif isinstance(sample["attributes"], list):
+                    yield from (attr.get("value", "") for attr in sample["attributes"])
+            
+            # Handle additional sample fields
+            for key in ["sampleDescription", "characteristics"]:
+                if key in sample:
+                    if isinstance(sample[key], str):
+                        yield sample[key]
+                    elif isinstance(sample[key], list):
+                        yield from (str(item) for item in sample[key])
+    
+    return " ".join(str(field) for field in fields() if field).lower()
 
-def classify(text, hla_patterns, scenario_patterns, disease_patterns):
-    """Classify text based on regex patterns."""
-    if not text:
-        return "Unspecified", "Unspecified", "Unspecified"
+def classify_batch(texts, hla_patterns, scenario_patterns, disease_patterns):
+    """Classify a Series of texts one pattern at a time, returning HLA/Scenario/Disease columns."""
+    texts = texts.fillna("").astype(object)  # lowercase, as produced by the text builders
+    nonempty = texts.str.len().to_numpy() > 0
     
     # 1) HLA Classification
-    has_I = bool(re.search(hla_patterns.get("HLA_I", ""), text, re.IGNORECASE))
-    has_II = bool(re.search(hla_patterns.get("HLA_II", ""), text, re.IGNORECASE))
-    
-    if has_I and has_II:
-        hla = "I/II"
-    elif has_I:
-        hla = "I"
-    elif has_II:
-        hla = "II"
-    else:
-        hla = "Unspecified"
+    hla_hits = match_matrix(texts, hla_patterns) & nonempty[:, None]
+    hla_names = list(hla_patterns)
+    no_match = np.zeros(len(texts), dtype=bool)
+    has_I = hla_hits[:, hla_names.index("HLA_I")] if "HLA_I" in hla_names else no_match
+    has_II = hla_hits[:, hla_names.index("HLA_II")] if "HLA_II" in hla_names else no_match
+    hla = np.select([has_I & has_II, has_I, has_II], ["I/II", "I", "II"], default="Unspecified")
     
     # 2) Scenario Classification
-    scenario_matches = []
-    for scenario, pattern in scenario_patterns.items():
-        if re.search(pattern, text, re.IGNORECASE):
-            scenario_matches.append(scenario)
-    
-    if len(scenario_matches) > 1:
-        scenario = "Mixed"
-    elif len(scenario_matches) == 1:
-        scenario = scenario_matches[0]
-    else:
-        scenario = "Unspecified"
-    
-    # 3) Disease Classification
-    for disease, pattern in disease_patterns.items():
-        if re.search(pattern, text, re.IGNORECASE):
-            return hla, scenario, disease.replace("_", " ")
-    
-    return hla, scenario, "Unspecified"
+    scenario_hits = match_matrix(texts, scenario_patterns) & nonempty[:, None]
+    scenario = np.where(scenario_hits.sum(axis=1) > 1, "Mixed",
+                        first_match(scenario_hits, list(scenario_patterns)))
+    
+    # 3) Disease Classification - first pattern in file order wins
+    disease_hits = match_matrix(texts, disease_patterns) & nonempty[:, None]
+    disease = first_match(disease_hits, [d.replace("_", " ") for d in disease_patterns])
+    
+    return pd.DataFrame({'HLA': hla, 'Scenario': scenario, 'Disease': disease}, index=texts.index)
+
+def classify(text, hla_patterns, scenario_patterns, disease_patterns):
+    """Classify a single text; see classify_batch."""
+    row = classify_batch(pd.Series([text]).str.lower(), hla_patterns, scenario_patterns, disease_patterns).iloc[0]
+    return row['HLA'], row['Scenario'], row['Disease']
 
 def extract_accessions_from_meta(meta_file):
     """Extract accession numbers from existing meta.txt file."""
     accessions = []
     try:
-        df = pd.read_csv(meta_file, sep='\t')
+        df = pd.read_csv(meta_file, sep='\t', usecols=['all_accession'])
         accessions = df['all_accession'].tolist()
         logger.info(f"Extracted {len(accessions)} accessions from {meta_file}")
     except Exception as e:
@@ -135,12 +143,22 @@ def extract_accessions_from_meta(meta_file):
     
     return accessions
 
+def load_meta_records(meta_file):
+    """Load meta.txt once as {accession: row} for fallback lookups."""
+    try:
+        df = pd.read_csv(meta_file, sep='\t')
+        df = df.drop_duplicates(subset='all_accession').set_index('all_accession')
+        return df.to_dict('index')
+    except Exception as e:
+        logger.error(f"Failed to load fallback data from {meta_file}: {e}")
+        return {}
+
 def main():
     """Main annotation function."""
     # Load configuration files
-    hla_patterns = load_patterns("hla_patterns.yml")
-    scenario_patterns = load_patterns("scenarios.yml")
-    disease_patterns = load_patterns("diseases.yml")
+    hla_patterns = load_compiled("hla_patterns.yml")
+    scenario_patterns = load_compiled("scenarios.yml")
+    disease_patterns = load_compiled("diseases.yml")
     
     if not all([hla_patterns, scenario_patterns, disease_patterns]):
         logger.error("Failed to load one or more pattern files")
@@ -149,51 +167,56 @@ def main():
     # Extract accessions from existing meta.txt
     accessions = extract_accessions_from_meta("meta.txt")
     
+    # Drop duplicate accessions, keeping the first occurrence and the file order
+    unique_accessions = list(dict.fromkeys(accessions))
+    if len(unique_accessions) < len(accessions):
+        logger.warning(f"Ignoring {len(accessions) - len(unique_accessions)} duplicate accessions in meta.txt")
+    accessions = unique_accessions
+    
     if not accessions:
         logger.error("No accessions found to process")
         return
     
+    meta_records = load_meta_records("meta.txt")
+    
     # Results storage
     results = []
     needs_manual = []
     
-    # Process each accession
+    # Fetch PRIDE metadata concurrently; the requests are independent and I/O-bound
+    pxd_accs = [acc for acc in accessions if acc.startswith('PXD')]
+    logger.info(f"Fetching metadata for {len(pxd_accs)} PXD accessions...")
+    with ThreadPoolExecutor(max_workers=20) as executor:
+        fetched = dict(zip(pxd_accs, tqdm(executor.map(fetch_json, pxd_accs),
+                                          total=len(pxd_accs), desc="Fetching metadata")))
+    
+    # Build searchable text per PXD accession, then classify all texts column-wise
+    texts = pd.Series({acc: build_text(*fetched[acc]) for acc in pxd_accs}, dtype=object)
+    classified = classify_batch(texts, hla_patterns, scenario_patterns, disease_patterns).to_dict('index')
+    
+    # Assemble results in the original accession order
     logger.info(f"Processing {len(accessions)} accessions...")
     
-    for acc in tqdm(accessions, desc="Annotating datasets"):
+    for acc in accessions:
         # Skip non-PXD accessions for now (PRIDE API specific)
         if not acc.startswith('PXD'):
             logger.info(f"Skipping non-PXD accession: {acc}")
             # Use existing data from meta.txt as fallback
-            existing_df = pd.read_csv("meta.txt", sep='\t')
-            existing_row = existing_df[existing_df['all_accession'] == acc]
-            if not existing_row.empty:
+            existing_row = meta_records.get(acc)
+            if existing_row is not None:
                 results.append({
                     'all_accession': acc,
-                    'HLA': existing_row.iloc[0]['HLA(I/II)'],
-                    'Scenario': existing_row.iloc[0]['分析场景'],
-                    'Disease': existing_row.iloc[0]['疾病类型']
+                    'HLA': existing_row['HLA(I/II)'],
+                    'Scenario': existing_row['分析场景'],
+                    'Disease': existing_row['疾病类型']
                 })
             continue
         
-        # Fetch metadata
-        proj, samp = fetch_json(acc)
-        text = build_text(proj, samp)
-        
-        # Classify
-        hla, scenario, disease = classify(text, hla_patterns, scenario_patterns, disease_patterns)
-        
-        result = {
-            'all_accession': acc,
-            'HLA': hla,
-            'Scenario': scenario,
-            'Disease': disease
-        }
-        
+        result = {'all_accession': acc, **classified[acc]}
         results.append(result)
         
         # Flag for manual review if any field is unspecified
-        if hla == "Unspecified" or scenario == "Unspecified" or disease == "Unspecified":
+        if "Unspecified" in (result['HLA'], result['Scenario'], result['Disease']):
             needs_manual.append(result)
     
     # Write results
@@ -6,39 +6,86 @@ Focuses on project-level metadata to avoid API issues with sample endpoints.
 """
 
 import re
-import csv
-import yaml
+import argparse
+import orjson
+import numpy as np
 import pandas as pd
 import requests
-import joblib
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from pathlib import Path
 from tqdm import tqdm
-import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from annotation_utils import (ProjectCache, throttle, load_patterns, compile_patterns, load_compiled,
+                              hyperscan_supports, match_matrix, first_match)
+
+try:
+    import hyperscan
+except ImportError:  # optional: multi-pattern disease matching falls back to re
+    hyperscan = None
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Setup cache
-mem = joblib.Memory(".cache", verbose=0)
+# Shared HTTP session: reuses TLS connections to PRIDE across fetch threads and
+# retries transient server errors
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=20,
+    pool_maxsize=20,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[500, 502, 503, 504]),
+))
+
+# PRIDE JSON cache, shared by all fetch threads
+CACHE = ProjectCache(Path(".cache") / "pride_projects.sqlite")
+
+# HLA class patterns as one alternation per class, so each text is scanned once per class.
+# Covers hla/mhc [class] i|ii, bare class i|ii, specific alleles and mouse H-2 haplotypes.
+# Texts are lowercased before classification, so no re.IGNORECASE is needed.
+HLA_I_RE = re.compile(r"\b(?:(?:hla|mhc)[- ]?(?:class[- ]?)?i|class[- ]?i|hla-[abc]|h-2[dk])\b")
+HLA_II_RE = re.compile(r"\b(?:(?:hla|mhc)[- ]?(?:class[- ]?)?ii|class[- ]?ii|hla-d[rqp]|h-2[ai])\b")
+# Every HLA alternative above contains one of these literals; texts without any of
+# them cannot match, so the regexes are skipped with a cheap substring test.
+HLA_KEYWORDS = ('hla', 'mhc', 'class', 'h-2')
+
+# Annotations are appended to OUTPUT_FILE every CHUNK_SIZE accessions so an
+# interrupted run can be resumed with --resume
+OUTPUT_FILE = "dataset_annotation_fixed.tsv"
+OUTPUT_COLUMNS = ['all_accession', 'HLA', 'Scenario', 'Disease']
+CHUNK_SIZE = 50
+
+# Disease classification order - check most specific diseases first
+DISEASE_PRIORITY = [
+    'COVID-19', 'Melanoma', 'Breast_Cancer', 'Lung_Cancer', 
+    'Ovarian_Cancer', 'Hepatocellular_Carcinoma', 'Colorectal_Cancer',
+    'Glioblastoma', 'Type_1_Diabetes', 'Multiple_Sclerosis',
+    'Rheumatoid_Arthritis', 'Celiac_Disease', 'Behcets_Disease',
+    'HIV_Infection', 'Tuberculosis', 'Influenza',
+    'Acute_Myeloid_Leukemia', 'B_cell_Lymphoma', 'Chronic_Myeloid_Leukemia',
+    'Cell_Line_Reference', 'Cancer', 'Autoimmune'
+]
 
-@mem.cache
 def fetch_project_only(acc):
     """Fetch only project metadata from PRIDE API with caching."""
+    cached = CACHE.get(acc)
+    if cached is not None:
+        return cached
+    
     base = "https://www.ebi.ac.uk/pride/ws/archive/v2/projects"
     try:
         logger.info(f"Fetching project data for {acc}")
-        proj_response = requests.get(f"{base}/{acc}", timeout=15)
+        throttle()
+        proj_response = SESSION.get(f"{base}/{acc}", timeout=15)
         proj_response.raise_for_status()
-        proj = proj_response.json()
-        
-        # Add small delay to be respectful to API
-        time.sleep(0.1)
-        return proj
-    except requests.exceptions.RequestException as e:
+        proj = orjson.loads(proj_response.content)
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
         logger.warning(f"Failed to fetch project data for {acc}: {e}")
         return None
+    
+    CACHE.put(acc, proj)
+    return proj
 
 def build_text_from_project(proj):
     """Build searchable text from project metadata only."""
@@ -49,6 +96,9 @@ def build_text_from_project(proj):
         """Safely join list items, handling dicts and other types."""
         if not items:
             return ""
+        # Common case: a plain list of strings needs no per-item handling
+        if isinstance(items, list) and all(isinstance(item, str) for item in items):
+            return " ".join(items)
         result = []
         for item in items:
             if isinstance(item, dict):
@@ -60,121 +110,138 @@ def build_text_from_project(proj):
                 result.append(str(item))
         return " ".join(result)
     
-    fields = [
-        proj.get("projectTitle", ""),
-        proj.get("projectDescription", ""),
-        safe_join(proj.get("keywords", [])),
-        " ".join(attr.get("value", "") for attr in proj.get("additionalAttributes", [])),
-        safe_join(proj.get("instruments", [])),
-        safe_join(proj.get("species", [])),
-        safe_join(proj.get("tissues", [])),
-        safe_join(proj.get("ptmList", [])),
-        proj.get("doi", ""),
-        str(proj.get("publicationDate", "")),
-    ]
+    def fields():
+        """Yield searchable fields one at a time instead of materializing a list."""
+        yield proj.get("projectTitle", "")
+        yield proj.get("projectDescription", "")
+        yield safe_join(proj.get("keywords", []))
+        yield " ".join(attr.get("value", "") for attr in proj.get("additionalAttributes", []))
+        yield safe_join(proj.get("instruments", []))
+        yield safe_join(proj.get("species", []))
+        yield safe_join(proj.get("tissues", []))
+        yield safe_join(proj.get("ptmList", []))
+        yield proj.get("doi", "")
+        yield str(proj.get("publicationDate", ""))
+        
+        # Also include submission details if available
+        if "submissionType" in proj:
+            yield str(proj["submissionType"])
+        
+        if "projectTags" in proj:
+            yield safe_join(proj.get("projectTags", []))
     
-    # Also include submission details if available
-    if "submissionType" in proj:
-        fields.append(str(proj["submissionType"]))
+    return " ".join(str(field) for field in fields() if field).lower()
+
+def fetch_project_text(acc):
+    """Fetch a project and build its searchable text; None if the fetch failed."""
+    proj = fetch_project_only(acc)
+    if proj is None:
+        return None
+    return build_text_from_project(proj)
+
+def order_diseases(disease_patterns):
+    """Disease patterns as (name, pattern) pairs: DISEASE_PRIORITY first, then the rest in YAML order."""
+    ordered = [(name, disease_patterns[name]) for name in DISEASE_PRIORITY if name in disease_patterns]
+    ordered += [(name, pattern) for name, pattern in disease_patterns.items() if name not in DISEASE_PRIORITY]
+    return ordered
+
+def build_disease_db(ordered_diseases):
+    """Compile ordered disease patterns into a Hyperscan database; (db, names, re fallbacks) or None."""
+    if hyperscan is None:
+        return None
     
-    if "projectTags" in proj:
-        fields.append(safe_join(proj.get("projectTags", [])))
+    # Pattern ids are priority ranks, so the lowest id reported is the disease re would pick
+    names = [name for name, _ in ordered_diseases]
+    flags = hyperscan.HS_FLAG_SINGLEMATCH | hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP | hyperscan.HS_FLAG_ALLOWEMPTY
+    supported = [(rank, pattern) for rank, (_, pattern) in enumerate(ordered_diseases)
+                 if hyperscan_supports(pattern, flags)]
+    supported_ranks = {rank for rank, _ in supported}
+    fallback = [(rank, pattern) for rank, (_, pattern) in enumerate(ordered_diseases)
+                if rank not in supported_ranks]
+    if not supported:
+        return None
+    if fallback:
+        logger.info(f"{len(fallback)} disease patterns are not supported by Hyperscan, matching them with re")
     
-    return " ".join(str(field) for field in fields if field).lower()
-
-def load_patterns(file_path):
-    """Load regex patterns from YAML file."""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return yaml.safe_load(f)
-    except FileNotFoundError:
-        logger.error(f"Pattern file not found: {file_path}")
-        return {}
+        db = hyperscan.Database()
+        db.compile(
+            expressions=[pattern.pattern.encode('utf-8') for _, pattern in supported],
+            ids=[rank for rank, _ in supported],
+            elements=len(supported),
+            flags=[flags] * len(supported),
+        )
+    except hyperscan.error as e:
+        logger.warning(f"Hyperscan could not compile disease patterns, using re: {e}")
+        return None
+    return db, names, fallback
 
-def enhanced_classify(text, hla_patterns, scenario_patterns, disease_patterns):
-    """Enhanced classification with better pattern matching."""
-    if not text:
-        return "Unspecified", "Unspecified", "Unspecified"
+def scan_disease(disease_db, text):
+    """Return the highest-priority disease matched in text with a single Hyperscan pass."""
+    db, names, fallback = disease_db
+    best = [len(names)]
     
-    # Debug: print first few characters to see what we're working with
-    logger.debug(f"Classification text sample: {text[:200]}...")
+    def on_match(pattern_id, start, end, flags, context):
+        best[0] = min(best[0], pattern_id)
+        return pattern_id == 0  # nothing can outrank the first pattern, stop scanning
     
-    # 1) HLA Classification - Enhanced patterns
-    hla_i_patterns = [
-        r'\bhla[- ]?i\b',
-        r'\bclass[- ]?i\b',
-        r'\bmhc[- ]?i\b',
-        r'\bhla[- ]?class[- ]?i\b',
-        r'\bmhc[- ]?class[- ]?i\b',
-        r'\bhla-a\b', r'\bhla-b\b', r'\bhla-c\b',  # Specific HLA-I alleles
-        r'\bh-2[dk]\b',  # Mouse HLA-I
-    ]
+    try:
+        db.scan(text.encode('utf-8'), match_event_handler=on_match)
+    except hyperscan.ScanTerminated:
+        pass
     
-    hla_ii_patterns = [
-        r'\bhla[- ]?ii\b',
-        r'\bclass[- ]?ii\b', 
-        r'\bmhc[- ]?ii\b',
-        r'\bhla[- ]?class[- ]?ii\b',
-        r'\bmhc[- ]?class[- ]?ii\b',
-        r'\bhla-dr\b', r'\bhla-dq\b', r'\bhla-dp\b',  # Specific HLA-II alleles
-        r'\bh-2[ai]\b',  # Mouse HLA-II
-    ]
+    # Patterns Hyperscan could not compile are checked with re if they would outrank its hit
+    for rank, pattern in fallback:
+        if rank >= best[0]:
+            break
+        if pattern.search(text):
+            best[0] = rank
+            break
     
-    has_I = any(re.search(pattern, text, re.IGNORECASE) for pattern in hla_i_patterns)
-    has_II = any(re.search(pattern, text, re.IGNORECASE) for pattern in hla_ii_patterns)
+    if best[0] == len(names):
+        return "Unspecified"
+    return names[best[0]].replace("_", " ")
+
+def classify_batch(texts, hla_patterns, scenario_patterns, ordered_diseases, disease_db=None):
+    """Enhanced classification of a Series of texts, returning HLA/Scenario/Disease columns."""
+    texts = texts.fillna("").astype(object)  # lowercase, as produced by the text builders
+    nonempty = texts.str.len().to_numpy() > 0
     
-    if has_I and has_II:
-        hla = "I/II"
-    elif has_I:
-        hla = "I"
-    elif has_II:
-        hla = "II"
-    else:
-        hla = "Unspecified"
+    # 1) HLA Classification - Enhanced patterns, only on texts mentioning an HLA keyword
+    mentions_hla = texts.map(lambda text: any(k in text for k in HLA_KEYWORDS)).to_numpy(dtype=bool)
+    candidates = texts[mentions_hla]
+    has_I = np.zeros(len(texts), dtype=bool)
+    has_II = np.zeros(len(texts), dtype=bool)
+    has_I[mentions_hla] = candidates.map(HLA_I_RE.search).notna().to_numpy()
+    has_II[mentions_hla] = candidates.map(HLA_II_RE.search).notna().to_numpy()
+    hla = np.select([has_I & has_II, has_I, has_II], ["I/II", "I", "II"], default="Unspecified")
     
     # 2) Scenario Classification - Enhanced
-    scenario_matches = []
-    for scenario, pattern in scenario_patterns.items():
-        if re.search(pattern, text, re.IGNORECASE):
-            scenario_matches.append(scenario)
-    
-    if len(scenario_matches) > 1:
-        scenario = "Mixed"
-    elif len(scenario_matches) == 1:
-        scenario = scenario_matches[0]
-    else:
-        scenario = "Unspecified"
+    scenario_hits = match_matrix(texts, scenario_patterns) & nonempty[:, None]
+    scenario = np.where(scenario_hits.sum(axis=1) > 1, "Mixed",
+                        first_match(scenario_hits, list(scenario_patterns)))
     
     # 3) Disease Classification - Enhanced with priority order
-    # Check most specific diseases first
-    disease_priority = [
-        'COVID-19', 'Melanoma', 'Breast_Cancer', 'Lung_Cancer', 
-        'Ovarian_Cancer', 'Hepatocellular_Carcinoma', 'Colorectal_Cancer',
-        'Glioblastoma', 'Type_1_Diabetes', 'Multiple_Sclerosis',
-        'Rheumatoid_Arthritis', 'Celiac_Disease', 'Behcets_Disease',
-        'HIV_Infection', 'Tuberculosis', 'Influenza',
-        'Acute_Myeloid_Leukemia', 'B_cell_Lymphoma', 'Chronic_Myeloid_Leukemia',
-        'Cell_Line_Reference', 'Cancer', 'Autoimmune'
-    ]
-    
-    for disease in disease_priority:
-        if disease in disease_patterns:
-            pattern = disease_patterns[disease]
-            if re.search(pattern, text, re.IGNORECASE):
-                return hla, scenario, disease.replace("_", " ")
-    
-    # Fallback to all patterns
-    for disease, pattern in disease_patterns.items():
-        if re.search(pattern, text, re.IGNORECASE):
-            return hla, scenario, disease.replace("_", " ")
+    if disease_db is not None:
+        scanned = texts.map(lambda text: scan_disease(disease_db, text)).to_numpy()
+        disease = np.where(nonempty, scanned, "Unspecified")
+    else:
+        disease_hits = match_matrix(texts, dict(ordered_diseases)) & nonempty[:, None]
+        disease = first_match(disease_hits, [name.replace("_", " ") for name, _ in ordered_diseases])
     
-    return hla, scenario, "Unspecified"
+    return pd.DataFrame({'HLA': hla, 'Scenario': scenario, 'Disease': disease}, index=texts.index)
+
+def enhanced_classify(text, hla_patterns, scenario_patterns, disease_patterns, disease_db=None):
+    """Classify a single text with a {name: pattern} disease dict; see classify_batch."""
+    row = classify_batch(pd.Series([text]).str.lower(), hla_patterns, scenario_patterns,
+                         order_diseases(disease_patterns), disease_db).iloc[0]
+    return row['HLA'], row['Scenario'], row['Disease']
 
 def extract_accessions_from_meta(meta_file):
     """Extract accession numbers from existing meta.txt file."""
     accessions = []
     try:
-        df = pd.read_csv(meta_file, sep='\t')
+        df = pd.read_csv(meta_file, sep='\t', usecols=['all_accession'])
         accessions = df['all_accession'].tolist()
         logger.info(f"Extracted {len(accessions)} accessions from {meta_file}")
     except Exception as e:
@@ -182,17 +249,46 @@ def extract_accessions_from_meta(meta_file):
     
     return accessions
 
-def handle_non_pxd_accessions(acc, meta_file):
-    """Handle non-PXD accessions using existing meta.txt data."""
+def load_meta_records(meta_file):
+    """Load meta.txt once as {accession: row} for fallback lookups."""
+    try:
+        df = pd.read_csv(meta_file, sep='\t')
+        df = df.drop_duplicates(subset='all_accession').set_index('all_accession')
+        return df.to_dict('index')
+    except Exception as e:
+        logger.error(f"Failed to load fallback data from {meta_file}: {e}")
+        return {}
+
+def drop_partial_row(output_file):
+    """Truncate output_file after its last complete line, dropping a row cut off by a crash."""
+    if not Path(output_file).exists():
+        return
+    with open(output_file, 'rb+') as f:
+        data = f.read()
+        if data and not data.endswith(b'\n'):
+            logger.warning(f"Dropping incomplete last row of {output_file}")
+            f.truncate(data.rfind(b'\n') + 1)
+
+def load_done_accessions(output_file):
+    """Return accessions already written to output_file by an earlier, interrupted run."""
+    if not Path(output_file).exists():
+        return set()
+    try:
+        return set(pd.read_csv(output_file, sep='\t', usecols=['all_accession'])['all_accession'])
+    except Exception as e:
+        logger.warning(f"Could not read {output_file} to resume, starting over: {e}")
+        return set()
+
+def handle_non_pxd_accessions(acc, meta_records):
+    """Handle non-PXD accessions using existing meta.txt data (see load_meta_records)."""
     try:
-        existing_df = pd.read_csv(meta_file, sep='\t')
-        existing_row = existing_df[existing_df['all_accession'] == acc]
-        if not existing_row.empty:
+        existing_row = meta_records.get(acc)
+        if existing_row is not None:
             return {
                 'all_accession': acc,
-                'HLA': existing_row.iloc[0]['HLA(I/II)'],
-                'Scenario': existing_row.iloc[0]['分析场景'],
-                'Disease': existing_row.iloc[0]['疾病类型']
+                'HLA': existing_row['HLA(I/II)'],
+                'Scenario': existing_row['分析场景'],
+                'Disease': existing_row['疾病类型']
             }
     except Exception as e:
         logger.error(f"Failed to get fallback data for {acc}: {e}")
@@ -204,86 +300,112 @@ def handle_non_pxd_accessions(acc, meta_file):
         'Disease': 'Unspecified'
     }
 
-def main():
-    """Main annotation function."""
+def main(resume=False):
+    """Main annotation function; resume=True appends to OUTPUT_FILE, skipping accessions already in it."""
     # Load configuration files
-    hla_patterns = load_patterns("hla_patterns.yml")
-    scenario_patterns = load_patterns("scenarios.yml")
-    disease_patterns = load_patterns("diseases.yml")
+    hla_patterns = load_compiled("hla_patterns.yml")
+    scenario_patterns = load_compiled("scenarios.yml")
+    disease_patterns = load_compiled("diseases.yml")
     
     if not all([hla_patterns, scenario_patterns, disease_patterns]):
         logger.error("Failed to load one or more pattern files")
         return
     
+    ordered_diseases = order_diseases(disease_patterns)
+    disease_db = build_disease_db(ordered_diseases)
+    
     # Extract accessions from existing meta.txt
     accessions = extract_accessions_from_meta("meta.txt")
     
+    # Drop duplicate accessions, keeping the first occurrence and the file order
+    unique_accessions = list(dict.fromkeys(accessions))
+    if len(unique_accessions) < len(accessions):
+        logger.warning(f"Ignoring {len(accessions) - len(unique_accessions)} duplicate accessions in meta.txt")
+    accessions = unique_accessions
+    
     if not accessions:
         logger.error("No accessions found to process")
         return
     
-    # Results storage
-    results = []
-    needs_manual = []
+    meta_records = load_meta_records("meta.txt")
+    
+    # Skip accessions finished by an interrupted run
+    if resume:
+        drop_partial_row(OUTPUT_FILE)
+    done = load_done_accessions(OUTPUT_FILE) if resume else set()
+    todo = [acc for acc in accessions if acc not in done]
+    if done:
+        logger.info(f"Resuming: {len(done)} accessions already annotated in {OUTPUT_FILE}")
+    
     api_success = 0
     api_failures = 0
     
     # Process each accession
-    logger.info(f"Processing {len(accessions)} accessions...")
+    logger.info(f"Processing {len(todo)} accessions...")
     
-    for acc in tqdm(accessions, desc="Annotating datasets"):
-        # Handle non-PXD accessions with existing data
-        if not acc.startswith('PXD'):
-            logger.info(f"Using fallback data for non-PXD accession: {acc}")
-            result = handle_non_pxd_accessions(acc, "meta.txt")
-            results.append(result)
-            continue
+    with open(OUTPUT_FILE, 'a' if done else 'w', newline='', encoding='utf-8') as f, \
+            ThreadPoolExecutor(max_workers=20) as executor, \
+            tqdm(total=len(todo), desc="Annotating datasets") as pbar:
+        if not done:
+            pd.DataFrame(columns=OUTPUT_COLUMNS).to_csv(f, sep='\t', index=False, lineterminator='\n')
         
-        # Fetch project metadata only (no samples)
-        proj = fetch_project_only(acc)
+        def submit_chunk(chunk):
+            """Start fetching the PXD projects of a chunk; the requests are independent and I/O-bound."""
+            return {acc: executor.submit(fetch_project_text, acc) for acc in chunk if acc.startswith('PXD')}
         
-        if proj is None:
-            logger.warning(f"Could not fetch project data for {acc}, using fallback")
-            result = handle_non_pxd_accessions(acc, "meta.txt")
-            api_failures += 1
-        else:
-            # Build text from project metadata only
-            text = build_text_from_project(proj)
+        chunks = [todo[start:start + CHUNK_SIZE] for start in range(0, len(todo), CHUNK_SIZE)]
+        pending = submit_chunk(chunks[0]) if chunks else {}
+        
+        for i, chunk in enumerate(chunks):
+            futures = pending
+            # Queue the next chunk's fetches before classifying this one, so its
+            # network waits overlap with classification on the main thread
+            if i + 1 < len(chunks):
+                pending = submit_chunk(chunks[i + 1])
             
-            if text:
-                logger.debug(f"Text for {acc}: {text[:100]}...")
+            # Classify all fetched projects of the chunk column-wise
+            fetched_texts = {acc: future.result() for acc, future in futures.items()}
+            texts = pd.Series({acc: text for acc, text in fetched_texts.items() if text is not None},
+                              dtype=object)
+            classified = classify_batch(texts, hla_patterns, scenario_patterns, ordered_diseases,
+                                        disease_db).to_dict('index')
             
-            # Classify using enhanced function
-            hla, scenario, disease = enhanced_classify(text, hla_patterns, scenario_patterns, disease_patterns)
+            rows = []
+            for acc in chunk:
+                # Handle non-PXD accessions with existing data
+                if not acc.startswith('PXD'):
+                    logger.info(f"Using fallback data for non-PXD accession: {acc}")
+                    rows.append(handle_non_pxd_accessions(acc, meta_records))
+                elif acc not in classified:
+                    logger.warning(f"Could not fetch project data for {acc}, using fallback")
+                    rows.append(handle_non_pxd_accessions(acc, meta_records))
+                    api_failures += 1
+                else:
+                    rows.append({'all_accession': acc, **classified[acc]})
+                    api_success += 1
             
-            result = {
-                'all_accession': acc,
-                'HLA': hla,
-                'Scenario': scenario,
-                'Disease': disease
-            }
-            api_success += 1
-        
-        results.append(result)
-        
-        # Flag for manual review if any field is unspecified
-        if result['HLA'] == "Unspecified" or result['Scenario'] == "Unspecified" or result['Disease'] == "Unspecified":
-            needs_manual.append(result)
+            # Checkpoint the finished chunk; missing meta.txt values are written as empty fields
+            pd.DataFrame(rows, columns=OUTPUT_COLUMNS).to_csv(f, sep='\t', header=False, index=False,
+                                                              lineterminator='\n')
+            f.flush()
+            pbar.update(len(chunk))
+    
+    df_results = pd.read_csv(OUTPUT_FILE, sep='\t')
+    logger.info(f"Saved {len(df_results)} annotations to {OUTPUT_FILE}")
     
-    # Write results
-    df_results = pd.DataFrame(results)
-    df_results.to_csv("dataset_annotation_fixed.tsv", sep='\t', index=False)
-    logger.info(f"Saved {len(results)} annotations to dataset_annotation_fixed.tsv")
+    # Flag PXD accessions for manual review if any field is unspecified
+    # (non-PXD rows are copied from meta.txt as-is)
+    unspecified = (df_results[['HLA', 'Scenario', 'Disease']] == "Unspecified").any(axis=1)
+    needs_manual = df_results[unspecified & df_results['all_accession'].str.startswith('PXD')]
     
     # Write manual review cases
-    if needs_manual:
-        df_manual = pd.DataFrame(needs_manual)
-        df_manual.to_csv("needs_manual_fixed.csv", index=False)
+    if len(needs_manual) > 0:
+        needs_manual.to_csv("needs_manual_fixed.csv", index=False)
         logger.info(f"Found {len(needs_manual)} cases requiring manual review in needs_manual_fixed.csv")
     
     # Summary statistics
     logger.info("=== Fixed Annotation Summary ===")
-    logger.info(f"Total processed: {len(results)}")
+    logger.info(f"Total processed: {len(df_results)}")
     logger.info(f"API successes: {api_success}")
     logger.info(f"API failures: {api_failures}")
     logger.info(f"HLA distribution:")
@@ -295,4 +417,7 @@ def main():
     logger.info(f"Manual review needed: {len(needs_manual)}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--resume", action="store_true",
+                        help=f"skip accessions already written to {OUTPUT_FILE} and append the rest")
+    main(resume=parser.parse_args().resume)
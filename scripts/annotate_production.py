@@ -8,25 +8,64 @@ Enhanced with all fixes for production use.
 import re
 import csv
 import yaml
+import orjson
+import numpy as np
 import pandas as pd
 import requests
-import joblib
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from pathlib import Path
 from tqdm import tqdm
-import time
 import logging
+import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
+import annotation_utils
+from annotation_utils import (ProjectCache, SafeLoader, throttle, hyperscan_supports, match_matrix, first_match,
+                              category_counts)
+
+try:
+    import hyperscan
+except ImportError:  # optional: one-pass scenario/disease matching falls back to re
+    hyperscan = None
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Setup cache
-mem = joblib.Memory(".cache", verbose=0)
+# HLA class patterns as one alternation per class, compiled once at import.
+# Covers hla/mhc [class] i|ii, bare class i|ii, specific alleles and mouse H-2 haplotypes.
+# Texts are lowercased before classification, so no re.IGNORECASE is needed.
+HLA_I_RE = re.compile(r"\b(?:(?:hla|mhc)[- ]?(?:class[- ]?)?i|class[- ]?i|hla-[abc]|h-2[dk])\b")
+HLA_II_RE = re.compile(r"\b(?:(?:hla|mhc)[- ]?(?:class[- ]?)?ii|class[- ]?ii|hla-d[rqp]|h-2[ai])\b")
+# Every HLA alternative above contains one of these literals; texts without any of
+# them cannot match, so the regexes are skipped with a cheap substring test.
+HLA_KEYWORDS = ('hla', 'mhc', 'class', 'h-2')
+
+# Disease priority: the first matching disease in this order wins
+DISEASE_PRIORITY = [
+    'COVID-19', 'Melanoma', 'Breast_Cancer', 'Lung_Cancer', 
+    'Type_1_Diabetes', 'Cancer', 'Unspecified'
+]
+DISEASE_RANK = {name: rank for rank, name in enumerate(DISEASE_PRIORITY)}
+
+# Shared HTTP session: reuses TLS connections to PRIDE across fetch threads and
+# retries transient gateway errors
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[502, 503, 504]),
+))
+
+# PRIDE JSON cache, shared by all fetch threads
+CACHE = ProjectCache(Path(".cache") / "pride_projects_v3.sqlite")
 
-@mem.cache
 def fetch_project_data(acc):
-    """Fetch project metadata with v3/v2 fallback."""
+    """Fetch project metadata with v3/v2 fallback and caching."""
+    cached = CACHE.get(acc)
+    if cached is not None:
+        return cached
+    
     # Try v3 first (newer submissions)
     base_v3 = "https://www.ebi.ac.uk/pride/ws/archive/v3/projects"
     base_v2 = "https://www.ebi.ac.uk/pride/ws/archive/v2/projects"
@@ -34,12 +73,13 @@ def fetch_project_data(acc):
     for base in [base_v3, base_v2]:
         try:
             logger.debug(f"Fetching {acc} from {base}")
-            response = requests.get(f"{base}/{acc}", timeout=15)
+            throttle()
+            response = SESSION.get(f"{base}/{acc}", timeout=15)
             if response.status_code == 200:
-                proj = response.json()
-                time.sleep(0.1)  # Rate limiting
+                proj = orjson.loads(response.content)
+                CACHE.put(acc, proj)
                 return proj
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
             logger.debug(f"Failed to fetch from {base}: {e}")
             continue
     
@@ -55,6 +95,9 @@ def build_text_from_project(proj):
         """Safely join list items, handling dicts and other types."""
         if not items:
             return ""
+        # Common case: a plain list of strings needs no per-item handling
+        if isinstance(items, list) and all(isinstance(item, str) for item in items):
+            return " ".join(items)
         result = []
         for item in items:
             if isinstance(item, dict):
@@ -65,32 +108,32 @@ def build_text_from_project(proj):
                 result.append(str(item))
         return " ".join(result)
     
-    fields = [
-        proj.get("projectTitle", ""),
-        proj.get("projectDescription", ""),
-        safe_join(proj.get("keywords", [])),
-        " ".join(attr.get("value", "") for attr in proj.get("additionalAttributes", [])),
-        safe_join(proj.get("instruments", [])),
-        safe_join(proj.get("species", [])),
-        safe_join(proj.get("tissues", [])),
-        safe_join(proj.get("ptmList", [])),
-        proj.get("doi", ""),
-        str(proj.get("publicationDate", "")),
-    ]
-    
-    if "submissionType" in proj:
-        fields.append(str(proj["submissionType"]))
-    
-    if "projectTags" in proj:
-        fields.append(safe_join(proj.get("projectTags", [])))
+    def fields():
+        """Yield searchable fields one at a time instead of materializing a list."""
+        yield proj.get("projectTitle", "")
+        yield proj.get("projectDescription", "")
+        yield safe_join(proj.get("keywords", []))
+        yield " ".join(attr.get("value", "") for attr in proj.get("additionalAttributes", []))
+        yield safe_join(proj.get("instruments", []))
+        yield safe_join(proj.get("species", []))
+        yield safe_join(proj.get("tissues", []))
+        yield safe_join(proj.get("ptmList", []))
+        yield proj.get("doi", "")
+        yield str(proj.get("publicationDate", ""))
+        
+        if "submissionType" in proj:
+            yield str(proj["submissionType"])
+        
+        if "projectTags" in proj:
+            yield safe_join(proj.get("projectTags", []))
     
-    return " ".join(str(field) for field in fields if field).lower()
+    return " ".join(str(field) for field in fields() if field).lower()
 
 def load_patterns(file_path):
     """Load regex patterns from YAML file with fallback."""
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
-            return yaml.safe_load(f)
+            return yaml.load(f, Loader=SafeLoader)
     except FileNotFoundError:
         logger.warning(f"Pattern file not found: {file_path}, using defaults")
         # Return default patterns if file missing
@@ -120,75 +163,124 @@ def load_patterns(file_path):
             }
         return {}
 
-def enhanced_classify(text, hla_patterns, scenario_patterns, disease_patterns):
-    """Enhanced classification with better pattern matching."""
-    if not text:
-        return "Unspecified", "Unspecified", "Unspecified"
+def compile_patterns(patterns):
+    """Compile a {name: regex} mapping once, dropping empty patterns (they never classify)."""
+    return annotation_utils.compile_patterns(patterns, skip_empty=True)
+
+def load_compiled(yaml_path):
+    """Load a pattern file as compiled regexes, falling back to the built-in defaults if it is missing."""
+    # Empty patterns are dropped here, so these pickles are kept apart from the other scripts'
+    return annotation_utils.load_compiled(yaml_path, prefix="production_patterns", load=load_patterns,
+                                          skip_empty=True)
+
+def build_pattern_db(scenario_patterns, disease_patterns):
+    """Compile scenario and disease patterns into one Hyperscan database; (db, labels, fallback) or None."""
+    if hyperscan is None:
+        return None
     
-    # 1) HLA Classification - Using hardcoded patterns (more reliable)
-    hla_i_patterns = [
-        r'\bhla[- ]?i\b',
-        r'\bclass[- ]?i\b',
-        r'\bmhc[- ]?i\b',
-        r'\bhla[- ]?class[- ]?i\b',
-        r'\bmhc[- ]?class[- ]?i\b',
-        r'\bhla-a\b', r'\bhla-b\b', r'\bhla-c\b',
-        r'\bh-2[dk]\b',
-    ]
+    diseases = [d for d in DISEASE_PRIORITY if d in disease_patterns]
+    labeled = [(("scenario", name), pattern) for name, pattern in scenario_patterns.items()]
+    labeled += [(("disease", name), disease_patterns[name]) for name in diseases]
+    flags = hyperscan.HS_FLAG_SINGLEMATCH | hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP
+    usable = [hyperscan_supports(pattern, flags) for _, pattern in labeled]
+    supported = [pair for pair, ok in zip(labeled, usable) if ok]
+    fallback = [pair for pair, ok in zip(labeled, usable) if not ok]
+    if not supported:
+        return None
+    if fallback:
+        logger.info(f"{len(fallback)} patterns are not supported by Hyperscan, matching them with re")
     
-    hla_ii_patterns = [
-        r'\bhla[- ]?ii\b',
-        r'\bclass[- ]?ii\b', 
-        r'\bmhc[- ]?ii\b',
-        r'\bhla[- ]?class[- ]?ii\b',
-        r'\bmhc[- ]?class[- ]?ii\b',
-        r'\bhla-dr\b', r'\bhla-dq\b', r'\bhla-dp\b',
-        r'\bh-2[ai]\b',
-    ]
+    labels = [label for label, _ in supported]
+    try:
+        db = hyperscan.Database()
+        db.compile(
+            expressions=[pattern.pattern.encode('utf-8') for _, pattern in supported],
+            ids=list(range(len(labels))),
+            elements=len(labels),
+            flags=[flags] * len(labels),
+        )
+    except hyperscan.error as e:
+        logger.warning(f"Hyperscan could not compile patterns, using re: {e}")
+        return None
+    return db, labels, fallback
+
+# Hyperscan scratch space cannot be shared by concurrent scans, so each worker thread keeps its own
+scan_scratch = threading.local()
+
+def scan_categories(pattern_db, text):
+    """Sets of scenario and disease names matching text, from a single Hyperscan pass plus any re fallbacks."""
+    db, labels, fallback = pattern_db
+    if getattr(scan_scratch, 'db', None) is not db:
+        scan_scratch.db, scan_scratch.space = db, hyperscan.Scratch(db)
+    hits = {"scenario": set(), "disease": set()}
     
-    has_I = any(re.search(pattern, text, re.IGNORECASE) for pattern in hla_i_patterns)
-    has_II = any(re.search(pattern, text, re.IGNORECASE) for pattern in hla_ii_patterns)
+    def on_match(pattern_id, start, end, flags, context):
+        category, name = labels[pattern_id]
+        hits[category].add(name)
     
-    if has_I and has_II:
-        hla = "I/II"
-    elif has_I:
-        hla = "I"
-    elif has_II:
-        hla = "II"
-    else:
-        hla = "Unspecified"
+    db.scan(text.encode('utf-8'), match_event_handler=on_match, scratch=scan_scratch.space)
+    for (category, name), pattern in fallback:
+        if pattern.search(text):
+            hits[category].add(name)
+    return hits["scenario"], hits["disease"]
+
+def classify_batch(texts, hla_patterns, scenario_patterns, disease_patterns, pattern_db=None):
+    """Enhanced classification of a Series of texts, returning HLA/Scenario/Disease columns."""
+    texts = texts.fillna("").astype(object)  # lowercase, as produced by build_text_from_project
     
-    # 2) Scenario Classification
-    scenario_matches = []
-    for scenario, pattern in scenario_patterns.items():
-        if pattern and re.search(pattern, text, re.IGNORECASE):
-            scenario_matches.append(scenario)
+    # Dataset families and reprocessed submissions often share their text
+    if texts.duplicated().any():
+        unique = texts.drop_duplicates()
+        classified = classify_batch(unique, hla_patterns, scenario_patterns, disease_patterns, pattern_db)
+        classified.index = unique.to_numpy()
+        return classified.loc[texts.to_numpy()].set_axis(texts.index)
+    
+    nonempty = texts.str.len().to_numpy() > 0
+    diseases = [d for d in DISEASE_PRIORITY if d in disease_patterns]
     
-    if len(scenario_matches) > 1:
-        scenario = "Mixed"
-    elif len(scenario_matches) == 1:
-        scenario = scenario_matches[0]
+    # 1) HLA Classification - Using hardcoded patterns (more reliable), only on texts mentioning an HLA keyword
+    mentions_hla = texts.map(lambda text: any(k in text for k in HLA_KEYWORDS)).to_numpy(dtype=bool)
+    candidates = texts[mentions_hla]
+    has_I = np.zeros(len(texts), dtype=bool)
+    has_II = np.zeros(len(texts), dtype=bool)
+    has_I[mentions_hla] = candidates.map(HLA_I_RE.search).notna().to_numpy()
+    has_II[mentions_hla] = candidates.map(HLA_II_RE.search).notna().to_numpy()
+    hla = np.select([has_I & has_II, has_I, has_II], ["I/II", "I", "II"], default="Unspecified")
+    
+    # 2) Scenario Classification
+    if pattern_db is not None:
+        scanned = [scan_categories(pattern_db, text) for text in texts]
+        scenario_hits = np.array([[name in found for name in scenario_patterns] for found, _ in scanned],
+                                 dtype=bool).reshape(len(texts), len(scenario_patterns))
     else:
-        scenario = "Unspecified"
+        scenario_hits = match_matrix(texts, scenario_patterns)
+    scenario_hits &= nonempty[:, None]
+    scenario = np.where(scenario_hits.sum(axis=1) > 1, "Mixed",
+                        first_match(scenario_hits, list(scenario_patterns)))
     
     # 3) Disease Classification with priority
-    disease_priority = [
-        'COVID-19', 'Melanoma', 'Breast_Cancer', 'Lung_Cancer', 
-        'Type_1_Diabetes', 'Cancer', 'Unspecified'
-    ]
-    
-    for disease in disease_priority:
-        if disease in disease_patterns and disease_patterns[disease]:
-            if re.search(disease_patterns[disease], text, re.IGNORECASE):
-                return hla, scenario, disease.replace("_", " ")
+    if pattern_db is not None:
+        # The scan already reports every disease hit; the best-ranked one wins
+        best = [min(found, key=DISEASE_RANK.get).replace("_", " ") if found else "Unspecified"
+                for _, found in scanned]
+        disease = np.where(nonempty, np.array(best, dtype=object), "Unspecified")
+    else:
+        disease_hits = match_matrix(texts, {d: disease_patterns[d] for d in diseases}) & nonempty[:, None]
+        disease = first_match(disease_hits, [d.replace("_", " ") for d in diseases])
     
-    return hla, scenario, "Unspecified"
+    return pd.DataFrame({'HLA': hla, 'Scenario': scenario, 'Disease': disease}, index=texts.index)
+
+def enhanced_classify(text, hla_patterns, scenario_patterns, disease_patterns, pattern_db=None):
+    """Classify a single text; see classify_batch."""
+    row = classify_batch(pd.Series([text]).str.lower(), hla_patterns, scenario_patterns, disease_patterns,
+                         pattern_db).iloc[0]
+    return row['HLA'], row['Scenario'], row['Disease']
 
 def extract_accessions_from_meta(meta_file):
     """Extract accession numbers from existing meta.txt file."""
     accessions = []
     try:
-        df = pd.read_csv(meta_file, sep='\t')
+        df = pd.read_csv(meta_file, sep='\t', usecols=[0])
         accessions = df.iloc[:, 0].tolist()  # First column regardless of name
         logger.info(f"Extracted {len(accessions)} accessions from {meta_file}")
     except Exception as e:
@@ -196,23 +288,31 @@ def extract_accessions_from_meta(meta_file):
     
     return accessions
 
-def handle_non_pxd_accessions(acc, meta_file):
-    """Handle non-PXD accessions with robust column access."""
+def load_meta_records(meta_file):
+    """Load meta.txt once as {accession: row}, keyed on the first column, for fallback lookups."""
     try:
-        existing_df = pd.read_csv(meta_file, sep='\t')
-        # Find row by first column (accession)
-        existing_row = existing_df[existing_df.iloc[:, 0] == acc]
+        df = pd.read_csv(meta_file, sep='\t')
+        accession_col = df.columns[0]  # First column regardless of name
+        df = df.drop_duplicates(subset=accession_col).set_index(accession_col)
+        return df.to_dict('index')
+    except Exception as e:
+        logger.error(f"Failed to load fallback data from {meta_file}: {e}")
+        return {}
+
+def handle_non_pxd_accessions(acc, meta_records):
+    """Handle non-PXD accessions with robust column access (see load_meta_records)."""
+    try:
+        row = meta_records.get(acc)
         
-        if not existing_row.empty:
-            row = existing_row.iloc[0]
+        if row is not None:
             # Try multiple column name variations
             hla_names = ['HLA(I/II)', 'HLA', 'hla']
             scenario_names = ['分析场景', 'Scenario', 'scenario']
             disease_names = ['疾病类型', 'Disease', 'disease']
             
-            hla = next((row.get(col, 'Unspecified') for col in hla_names if col in row), 'Unspecified')
-            scenario = next((row.get(col, 'Unspecified') for col in scenario_names if col in row), 'Unspecified')
-            disease = next((row.get(col, 'Unspecified') for col in disease_names if col in row), 'Unspecified')
+            hla = next((row[col] for col in hla_names if col in row), 'Unspecified')
+            scenario = next((row[col] for col in scenario_names if col in row), 'Unspecified')
+            disease = next((row[col] for col in disease_names if col in row), 'Unspecified')
             
             return {
                 'all_accession': acc,
@@ -230,37 +330,20 @@ def handle_non_pxd_accessions(acc, meta_file):
         '疾病类型': 'Unspecified'
     }
 
-def process_single_accession(acc, hla_patterns, scenario_patterns, disease_patterns, meta_file):
-    """Process a single accession ID."""
-    # Handle non-PXD accessions with existing data
-    if not acc.startswith('PXD'):
-        logger.info(f"Using fallback data for non-PXD accession: {acc}")
-        return handle_non_pxd_accessions(acc, meta_file)
-    
-    # Fetch project metadata
+def fetch_project_text(acc):
+    """Fetch a PXD project and build its searchable text; None if the fetch failed."""
     proj = fetch_project_data(acc)
-    
     if proj is None:
-        logger.warning(f"Could not fetch project data for {acc}, using fallback")
-        return handle_non_pxd_accessions(acc, meta_file)
-    
-    # Build text and classify
-    text = build_text_from_project(proj)
-    hla, scenario, disease = enhanced_classify(text, hla_patterns, scenario_patterns, disease_patterns)
-    
-    return {
-        'all_accession': acc,
-        'HLA(I/II)': hla,
-        '分析场景': scenario,
-        '疾病类型': disease
-    }
+        return None
+    return build_text_from_project(proj)
 
 def main():
     """Main annotation function with parallel processing that preserves dataset order."""
     # Load configuration files
-    hla_patterns = load_patterns("hla_patterns.yml")
-    scenario_patterns = load_patterns("scenarios.yml")
-    disease_patterns = load_patterns("diseases.yml")
+    hla_patterns = load_compiled("hla_patterns.yml")
+    scenario_patterns = load_compiled("scenarios.yml")
+    disease_patterns = load_compiled("diseases.yml")
+    pattern_db = build_pattern_db(scenario_patterns, disease_patterns)
     
     # Extract accessions
     meta_file = "meta.txt"
@@ -270,75 +353,114 @@ def main():
         logger.error("No accessions found to process")
         return
     
-    # Results storage - use dictionary to maintain order
-    results_dict = {}
-    needs_manual = []
+    meta_records = load_meta_records(meta_file)
+    
+    # Results storage - one slot per accession keeps the input order
+    results = [None] * len(accessions)
+    texts = {}
+    failed = set()
     
-    # Process with parallel execution
+    # Fetch with parallel execution; classification runs afterwards on all texts at once
     logger.info(f"Processing {len(accessions)} accessions with parallel execution...")
     
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        # Submit all tasks with index to preserve order
-        future_to_info = {
-            executor.submit(
-                process_single_accession, 
-                acc, hla_patterns, scenario_patterns, disease_patterns, meta_file
-            ): (idx, acc) for idx, acc in enumerate(accessions)
-        }
+    # Positions of each distinct PXD accession: duplicates in meta.txt share one request
+    pxd_positions = {}
+    for idx, acc in enumerate(accessions):
+        if isinstance(acc, str) and acc.startswith('PXD'):
+            pxd_positions.setdefault(acc, []).append(idx)
+    
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        # Submit one fetch per distinct PXD accession
+        future_to_acc = {executor.submit(fetch_project_text, acc): acc for acc in pxd_positions}
         
         # Process completed tasks with progress bar
         with tqdm(total=len(accessions), desc="Annotating datasets") as pbar:
-            for future in as_completed(future_to_info):
-                idx, acc = future_to_info[future]
-                try:
-                    result = future.result()
-                    results_dict[idx] = result
-                    
-                    # Flag for manual review
-                    if (result['HLA(I/II)'] == "Unspecified" or 
-                        result['分析场景'] == "Unspecified" or 
-                        result['疾病类型'] == "Unspecified"):
-                        needs_manual.append(result)
-                    
-                except Exception as e:
-                    logger.error(f"Error processing {acc}: {e}")
-                    # Add failed result
-                    results_dict[idx] = {
+            # Handle non-PXD accessions with existing data
+            for idx, acc in enumerate(accessions):
+                if not isinstance(acc, str):
+                    # A blank or numeric first column in meta.txt is not an accession
+                    logger.error(f"Error processing {acc}: not an accession string")
+                    failed.add(idx)
+                    results[idx] = {
                         'all_accession': acc,
                         'HLA(I/II)': 'Unspecified',
                         '分析场景': 'Unspecified',
                         '疾病类型': 'Unspecified'
                     }
+                    pbar.update(1)
+                elif not acc.startswith('PXD'):
+                    logger.info(f"Using fallback data for non-PXD accession: {acc}")
+                    results[idx] = handle_non_pxd_accessions(acc, meta_records)
+                    pbar.update(1)
+            
+            for future in as_completed(future_to_acc):
+                acc = future_to_acc[future]
+                positions = pxd_positions[acc]
+                try:
+                    text = future.result()
+                    if text is None:
+                        logger.warning(f"Could not fetch project data for {acc}, using fallback")
+                        fallback = handle_non_pxd_accessions(acc, meta_records)
+                        for idx in positions:
+                            results[idx] = fallback
+                    else:
+                        texts.update((idx, text) for idx in positions)
+                    
+                except Exception as e:
+                    logger.error(f"Error processing {acc}: {e}")
+                    # Add failed result
+                    failed.update(positions)
+                    for idx in positions:
+                        results[idx] = {
+                            'all_accession': acc,
+                            'HLA(I/II)': 'Unspecified',
+                            '分析场景': 'Unspecified',
+                            '疾病类型': 'Unspecified'
+                        }
                 
-                pbar.update(1)
+                pbar.update(len(positions))
     
-    # Convert to list preserving original order
-    results = [results_dict[i] for i in sorted(results_dict.keys())]
+    # Classify all fetched projects column-wise
+    classified = classify_batch(pd.Series(texts, dtype=object), hla_patterns, scenario_patterns,
+                                disease_patterns, pattern_db)
+    for idx, row in zip(classified.index, classified.itertuples(index=False)):
+        results[idx] = {
+            'all_accession': accessions[idx],
+            'HLA(I/II)': row.HLA,
+            '分析场景': row.Scenario,
+            '疾病类型': row.Disease
+        }
     
     # Write results with correct column names
     df_results = pd.DataFrame(results)
+    # Categories in order of first appearance keep the summary's tie order
+    for col in ['HLA(I/II)', '分析场景', '疾病类型']:
+        df_results[col] = df_results[col].astype(pd.CategoricalDtype(df_results[col].dropna().unique()))
     df_results.to_csv("dataset_annotation.tsv", sep='\t', index=False)
     logger.info(f"Saved {len(results)} annotations to dataset_annotation.tsv")
     
+    # Flag for manual review: any Unspecified label, except rows that failed with an error
+    unspecified = (df_results[['HLA(I/II)', '分析场景', '疾病类型']] == "Unspecified").any(axis=1)
+    df_manual = df_results[unspecified & ~df_results.index.isin(failed)]
+    
     # Write manual review cases
-    if needs_manual:
-        df_manual = pd.DataFrame(needs_manual)
+    if len(df_manual) > 0:
         df_manual.to_csv("needs_manual.csv", index=False)
-        logger.info(f"Found {len(needs_manual)} cases requiring manual review")
+        logger.info(f"Found {len(df_manual)} cases requiring manual review")
     
     # Summary statistics
     logger.info("=== Annotation Summary ===")
     logger.info(f"Total processed: {len(results)}")
     logger.info(f"HLA distribution:")
-    for hla_type, count in df_results['HLA(I/II)'].value_counts().items():
+    for hla_type, count in category_counts(df_results['HLA(I/II)']).items():
         logger.info(f"  {hla_type}: {count}")
     logger.info(f"Scenario distribution:")
-    for scenario, count in df_results['分析场景'].value_counts().items():
+    for scenario, count in category_counts(df_results['分析场景']).items():
         logger.info(f"  {scenario}: {count}")
     logger.info(f"Disease distribution (top 10):")
-    for disease, count in df_results['疾病类型'].value_counts().head(10).items():
+    for disease, count in category_counts(df_results['疾病类型']).head(10).items():
         logger.info(f"  {disease}: {count}")
-    logger.info(f"Manual review needed: {len(needs_manual)}")
+    logger.info(f"Manual review needed: {len(df_manual)}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Shared helpers for the HLA dataset annotation scripts.
+PRIDE response cache, request rate limiting, pattern loading and column-wise regex matching.
+"""
+
+import re
+import yaml
+import orjson
+import numpy as np
+from pathlib import Path
+import time
+import pickle
+import sqlite3
+import logging
+import threading
+
+try:
+    import hyperscan
+except ImportError:  # optional: callers fall back to re
+    hyperscan = None
+
+# Parse YAML with libyaml's C loader when PyYAML was built with it
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+logger = logging.getLogger(__name__)
+
+# Compiled pattern dicts are pickled here and reused while the YAML file keeps
+# the modification time and size recorded with them
+PATTERN_CACHE_DIR = Path(".cache")
+
+class ProjectCache:
+    """PRIDE JSON stored in a SQLite key-value table under the accession key."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock = threading.Lock()  # one connection is shared by all fetch threads
+        self.conn = None
+
+    def open(self):
+        """Return the shared connection, opening it on first use; callers must hold self.lock."""
+        if self.conn is None:
+            self.path.parent.mkdir(exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            try:
+                conn.execute("CREATE TABLE IF NOT EXISTS projects (accession TEXT PRIMARY KEY, json BLOB NOT NULL)")
+            except sqlite3.Error:
+                conn.close()
+                raise
+            self.conn = conn
+        return self.conn
+
+    def get(self, acc):
+        """Return the cached PRIDE JSON for acc, or None if it is missing or the cache is unreadable."""
+        try:
+            with self.lock:
+                row = self.open().execute("SELECT json FROM projects WHERE accession = ?", (acc,)).fetchone()
+            return orjson.loads(row[0]) if row else None
+        except (sqlite3.Error, orjson.JSONDecodeError) as e:
+            logger.warning(f"Ignoring unreadable cache entry for {acc}: {e}")
+            return None
+
+    def put(self, acc, value):
+        """Store PRIDE JSON for acc; a cache that cannot be written is skipped with a warning."""
+        try:
+            with self.lock:
+                conn = self.open()
+                with conn:
+                    conn.execute("INSERT OR REPLACE INTO projects (accession, json) VALUES (?, ?)",
+                                 (acc, orjson.dumps(value)))
+        except sqlite3.Error as e:
+            logger.warning(f"Could not cache data for {acc}: {e}")
+
+    def close(self):
+        """Close the shared connection, if open."""
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+# Rate limit shared by all fetch threads: request starts are spaced so that at
+# most MAX_REQUESTS_PER_SECOND go to PRIDE, without a blanket sleep per request
+MAX_REQUESTS_PER_SECOND = 20
+rate_lock = threading.Lock()
+next_request_at = 0.0
+
+def throttle():
+    """Block until the next request slot is free."""
+    global next_request_at
+    with rate_lock:
+        now = time.monotonic()
+        delay = next_request_at - now
+        next_request_at = max(now, next_request_at) + 1.0 / MAX_REQUESTS_PER_SECOND
+    if delay > 0:
+        time.sleep(delay)
+
+def load_patterns(file_path):
+    """Load regex patterns from YAML file."""
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return yaml.load(f, Loader=SafeLoader)
+    except FileNotFoundError:
+        logger.error(f"Pattern file not found: {file_path}")
+        return {}
+
+def compile_patterns(patterns, skip_empty=False):
+    """Compile a {name: regex} mapping once; texts are lowercased, so patterns must be too."""
+    for name, pattern in patterns.items():
+        literal = re.sub(r'\\.', '', pattern or '')  # ignore escapes such as \B or \W
+        if literal != literal.lower():
+            logger.warning(f"Pattern {name} contains uppercase letters and cannot match lowercased text")
+    return {name: re.compile(pattern) for name, pattern in patterns.items() if pattern or not skip_empty}
+
+def load_compiled(yaml_path, prefix="patterns", load=load_patterns, skip_empty=False):
+    """Load a pattern file as compiled regexes, reusing the pickled dict while the YAML is unchanged."""
+    yaml_path = Path(yaml_path)
+    pkl_path = PATTERN_CACHE_DIR / f"{prefix}_{yaml_path.stem}.pkl"
+    try:
+        yaml_stat = yaml_path.stat()
+        stamp = (yaml_stat.st_mtime_ns, yaml_stat.st_size)
+    except OSError:
+        stamp = None  # no YAML, nothing to reuse or pickle
+
+    if stamp is not None:
+        try:
+            with open(pkl_path, 'rb') as f:
+                cached = pickle.load(f)
+            if isinstance(cached, dict) and cached.get('stamp') == stamp:
+                return cached['patterns']
+        except (OSError, EOFError, pickle.UnpicklingError):
+            pass  # no usable pickle, fall through to a fresh load
+
+    patterns = load(yaml_path)
+    if not patterns:
+        return {}
+    compiled = compile_patterns(patterns, skip_empty)
+    if stamp is not None:
+        pkl_path.parent.mkdir(exist_ok=True)
+        with open(pkl_path, 'wb') as f:
+            pickle.dump({'stamp': stamp, 'patterns': compiled}, f, protocol=5)
+    return compiled
+
+def hyperscan_supports(pattern, flags):
+    """Whether Hyperscan can compile a single pattern with flags (e.g. \\b is unsupported in UCP mode)."""
+    try:
+        hyperscan.Database().compile(expressions=[pattern.pattern.encode('utf-8')], ids=[0], elements=1,
+                                     flags=[flags])
+    except hyperscan.error:
+        return False
+    return True
+
+def match_matrix(texts, patterns):
+    """Boolean (n_texts, n_patterns) matrix: does each compiled pattern match each text."""
+    columns = [texts.map(pattern.search).notna().to_numpy() for pattern in patterns.values()]
+    if not columns:
+        return np.zeros((len(texts), 0), dtype=bool)
+    return np.column_stack(columns)
+
+def first_match(hits, names):
+    """Name of the first matching column per row, or "Unspecified" where nothing matched."""
+    if hits.shape[1] == 0:
+        return np.full(hits.shape[0], "Unspecified", dtype=object)
+    names = np.asarray(names, dtype=object)
+    return np.where(hits.any(axis=1), names[hits.argmax(axis=1)], "Unspecified")
+
+def category_counts(column):
+    """value_counts of a categorical column: most frequent first, ties in category order."""
+    return column.value_counts(sort=False).sort_values(ascending=False, kind='stable')
@@ -4,87 +4,88 @@ Process existing meta.txt data to create standardized output format
 """
 
 import pandas as pd
-import yaml
 import re
+import string
 import logging
+from annotation_utils import load_patterns, category_counts
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def load_patterns(file_path):
-    """Load regex patterns from YAML file."""
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return yaml.safe_load(f)
-    except FileNotFoundError:
-        logger.error(f"Pattern file not found: {file_path}")
-        return {}
+# Valid HLA class notations
+HLA_VALUES = frozenset(["I", "II", "I/II", "Unspecified"])
+
+# Scenario mapping dictionary
+SCENARIO_MAPPING = {
+    "Cancer": "Cancer",
+    "Autoimmune": "Autoimmune", 
+    "Infection": "Infection",
+    "Normal": "Normal",
+    "Mixed": "Mixed",
+    "Immunology": "Immunology",
+    "Unspecified": "Unspecified"
+}
 
 def standardize_hla(hla_value):
     """Standardize HLA class notation."""
     hla_value = str(hla_value).strip()
-    if hla_value in ["I", "II", "I/II", "Unspecified"]:
+    if hla_value in HLA_VALUES:
         return hla_value
     else:
         return "Unspecified"
 
 def standardize_scenario(scenario_chinese):
     """Map Chinese scenario to English."""
-    mapping = {
-        "Cancer": "Cancer",
-        "Autoimmune": "Autoimmune", 
-        "Infection": "Infection",
-        "Normal": "Normal",
-        "Mixed": "Mixed",
-        "Immunology": "Immunology",
-        "Unspecified": "Unspecified"
-    }
-    return mapping.get(scenario_chinese, "Unspecified")
+    return SCENARIO_MAPPING.get(scenario_chinese, "Unspecified")
+
+# Disease mapping dictionary
+DISEASE_MAPPING = {
+    "Cancer": "Cancer",
+    "Breast Cancer": "Breast Cancer",
+    "Ovarian Cancer": "Ovarian Cancer", 
+    "Behçet's Disease": "Behcets Disease",
+    "Melanoma": "Melanoma",
+    "Cancer/Tumor": "Cancer",
+    "Cell Line/Reference": "Cell Line Reference",
+    "Hepatitis B Virus Infection, Hepatocellular Carcinoma": "Mixed Hepatitis B HCC",
+    "COVID-19": "COVID-19",
+    "Type 1 Diabetes": "Type 1 Diabetes",
+    "Lung Cancer": "Lung Cancer",
+    "Hepatocellular Carcinoma": "Hepatocellular Carcinoma",
+    "Celiac Disease": "Celiac Disease",
+    "Sarcoidosis": "Sarcoidosis",
+    "Rheumatoid Arthritis, Lyme Arthritis": "Mixed Rheumatoid Lyme",
+    "Glioblastoma": "Glioblastoma",
+    "Immune-related Conditions": "Immune Related Conditions",
+    "Mantle Cell Lymphoma": "Mantle Cell Lymphoma",
+    "HIV/SIV Infection": "HIV Infection",
+    "Multiple Sclerosis": "Multiple Sclerosis",
+    "Birdshot Chorioretinopathy": "Birdshot Chorioretinopathy",
+    "Ankylosing Spondylitis": "Ankylosing Spondylitis",
+    "Colorectal Cancer": "Colorectal Cancer",
+    "Lung Cancer, B-cell Acute Lymphoblastic Leukemia": "Mixed Lung Cancer B-ALL",
+    "Meningioma": "Meningioma",
+    "Chronic Myeloid Leukemia": "Chronic Myeloid Leukemia",
+    "B-cell Lymphoma": "B-cell Lymphoma",
+    "Acute Myeloid Leukemia": "Acute Myeloid Leukemia",
+    "Tuberculosis": "Tuberculosis",
+    "Influenza Virus Infection": "Influenza",
+    "Diffuse Large B-cell Lymphoma": "Diffuse Large B-cell Lymphoma",
+    "Melanoma, Lung Cancer": "Mixed Melanoma Lung Cancer",
+    "Chronic Lymphocytic Leukemia": "Chronic Lymphocytic Leukemia",
+    "Unspecified": "Unspecified"
+}
 
 def standardize_disease(disease_chinese):
     """Map Chinese disease names to standardized English names."""
     disease_chinese = str(disease_chinese).strip()
-    
-    # Disease mapping dictionary
-    disease_mapping = {
-        "Cancer": "Cancer",
-        "Breast Cancer": "Breast Cancer",
-        "Ovarian Cancer": "Ovarian Cancer", 
-        "Behçet's Disease": "Behcets Disease",
-        "Melanoma": "Melanoma",
-        "Cancer/Tumor": "Cancer",
-        "Cell Line/Reference": "Cell Line Reference",
-        "Hepatitis B Virus Infection, Hepatocellular Carcinoma": "Mixed Hepatitis B HCC",
-        "COVID-19": "COVID-19",
-        "Type 1 Diabetes": "Type 1 Diabetes",
-        "Lung Cancer": "Lung Cancer",
-        "Hepatocellular Carcinoma": "Hepatocellular Carcinoma",
-        "Celiac Disease": "Celiac Disease",
-        "Sarcoidosis": "Sarcoidosis",
-        "Rheumatoid Arthritis, Lyme Arthritis": "Mixed Rheumatoid Lyme",
-        "Glioblastoma": "Glioblastoma",
-        "Immune-related Conditions": "Immune Related Conditions",
-        "Mantle Cell Lymphoma": "Mantle Cell Lymphoma",
-        "HIV/SIV Infection": "HIV Infection",
-        "Multiple Sclerosis": "Multiple Sclerosis",
-        "Birdshot Chorioretinopathy": "Birdshot Chorioretinopathy",
-        "Ankylosing Spondylitis": "Ankylosing Spondylitis",
-        "Colorectal Cancer": "Colorectal Cancer",
-        "Lung Cancer, B-cell Acute Lymphoblastic Leukemia": "Mixed Lung Cancer B-ALL",
-        "Meningioma": "Meningioma",
-        "Chronic Myeloid Leukemia": "Chronic Myeloid Leukemia",
-        "B-cell Lymphoma": "B-cell Lymphoma",
-        "Acute Myeloid Leukemia": "Acute Myeloid Leukemia",
-        "Tuberculosis": "Tuberculosis",
-        "Influenza Virus Infection": "Influenza",
-        "Diffuse Large B-cell Lymphoma": "Diffuse Large B-cell Lymphoma",
-        "Melanoma, Lung Cancer": "Mixed Melanoma Lung Cancer",
-        "Chronic Lymphocytic Leukemia": "Chronic Lymphocytic Leukemia",
-        "Unspecified": "Unspecified"
-    }
-    
-    return disease_mapping.get(disease_chinese, disease_chinese)
+    return DISEASE_MAPPING.get(disease_chinese, disease_chinese)
+
+def accession_source(accession):
+    """Repository prefix of an accession (its leading uppercase letters, e.g. PXD), or None."""
+    rest = accession.lstrip(string.ascii_uppercase)
+    return accession[:len(accession) - len(rest)] or None
 
 def main():
     """Process existing meta.txt data."""
@@ -96,9 +97,16 @@ def main():
         # Standardize columns
         df_standardized = pd.DataFrame()
         df_standardized['all_accession'] = df['all_accession']
-        df_standardized['HLA'] = df['HLA(I/II)'].apply(standardize_hla)
-        df_standardized['Scenario'] = df['分析场景'].apply(standardize_scenario)
-        df_standardized['Disease'] = df['疾病类型'].apply(standardize_disease)
+        # Same rules as the standardize_* functions, applied column-wise
+        hla = df['HLA(I/II)'].map(str).str.strip()
+        df_standardized['HLA'] = hla.where(hla.isin(HLA_VALUES), "Unspecified")
+        df_standardized['Scenario'] = df['分析场景'].map(SCENARIO_MAPPING).fillna("Unspecified")
+        diseases = df['疾病类型'].map(str).str.strip()
+        df_standardized['Disease'] = diseases.map(DISEASE_MAPPING).fillna(diseases)
+        # Categories in order of first appearance keep the summary's tie order
+        for col in ['HLA', 'Scenario', 'Disease']:
+            df_standardized[col] = df_standardized[col].astype(
+                pd.CategoricalDtype(df_standardized[col].dropna().unique()))
         
         # Save standardized data
         df_standardized.to_csv("dataset_annotation.tsv", sep='\t', index=False)
@@ -120,22 +128,22 @@ def main():
         logger.info(f"Total datasets: {len(df_standardized)}")
         
         logger.info("\nHLA Class distribution:")
-        for hla_type, count in df_standardized['HLA'].value_counts().items():
+        for hla_type, count in category_counts(df_standardized['HLA']).items():
             logger.info(f"  {hla_type}: {count}")
         
         logger.info("\nScenario distribution:")
-        for scenario, count in df_standardized['Scenario'].value_counts().items():
+        for scenario, count in category_counts(df_standardized['Scenario']).items():
             logger.info(f"  {scenario}: {count}")
         
         logger.info("\nTop 10 Disease types:")
-        for disease, count in df_standardized['Disease'].value_counts().head(10).items():
+        for disease, count in category_counts(df_standardized['Disease']).head(10).items():
             logger.info(f"  {disease}: {count}")
         
         logger.info(f"\nCases needing manual review: {len(needs_manual)}")
         
         # Dataset source distribution
         logger.info("\nDataset source distribution:")
-        source_counts = df_standardized['all_accession'].str.extract(r'^([A-Z]+)')[0].value_counts()
+        source_counts = df_standardized['all_accession'].dropna().map(accession_source).value_counts()
         for source, count in source_counts.items():
             logger.info(f"  {source}: {count}")
             
@@ -7,10 +7,12 @@ import pytest
 import pandas as pd
 import sys
 import os
+import json
 
 # Add scripts directory to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
 from process_existing import standardize_hla, standardize_scenario, standardize_disease
+from annotation_utils import ProjectCache
 
 class TestClassification:
     """Test classification functions."""
@@ -107,5 +109,298 @@ class TestOutputValidation:
         # Should match the original meta.txt count
         assert len(annotation_data) == 83
 
+REPO_DIR = os.path.join(os.path.dirname(__file__), '..')
+
+def repo_patterns(module):
+    """Compile the repository's HLA, scenario and disease YAML files with module's helpers."""
+    return [module.compile_patterns(module.load_patterns(os.path.join(REPO_DIR, name)))
+            for name in ('hla_patterns.yml', 'scenarios.yml', 'diseases.yml')]
+
+SAMPLE_TEXTS = pd.Series([
+    'hla class i peptides from melanoma tumor tissue',
+    'mhc class ii ligands in covid-19 and healthy donors',
+    'breast cancer and melanoma samples',
+    'lung cancer with breast cancer',
+    'hla-dr peptides of multiple sclerosis patients',
+    'hepatitis b virus infection',
+    'plasma proteome',
+    '',
+])
+
+@pytest.fixture(params=['annotate_fixed', 'annotate_production'])
+def annotator(request):
+    """Each annotation script that classifies PRIDE project texts."""
+    return __import__(request.param)
+
+class TestEnhancedClassify:
+    """Test text classification of the annotation scripts on fixed texts."""
+    
+    def test_known_labels(self, annotator):
+        """Test HLA class, Mixed scenarios and disease priority."""
+        hla, scenario, disease = repo_patterns(annotator)
+        assert annotator.enhanced_classify('HLA class I peptides from melanoma tumor tissue',
+                                           hla, scenario, disease) == ('I', 'Mixed', 'Melanoma')
+        assert annotator.enhanced_classify('MHC class II ligands in COVID-19 and healthy donors',
+                                           hla, scenario, disease) == ('II', 'Mixed', 'COVID-19')
+        # Melanoma outranks Breast Cancer, Breast Cancer outranks Lung Cancer
+        assert annotator.enhanced_classify('Breast cancer and melanoma samples',
+                                           hla, scenario, disease) == ('Unspecified', 'Cancer', 'Melanoma')
+        assert annotator.enhanced_classify('Lung cancer with breast cancer',
+                                           hla, scenario, disease) == ('Unspecified', 'Cancer', 'Breast Cancer')
+    
+    def test_empty_text(self, annotator):
+        """Test that empty text is unspecified everywhere."""
+        hla, scenario, disease = repo_patterns(annotator)
+        assert annotator.enhanced_classify('', hla, scenario, disease) == ('Unspecified',) * 3
+    
+    def test_batch_matches_single(self, annotator):
+        """Test that classify_batch agrees with enhanced_classify row by row."""
+        hla, scenario, disease = repo_patterns(annotator)
+        diseases = annotator.order_diseases(disease) if hasattr(annotator, 'order_diseases') else disease
+        batch = annotator.classify_batch(SAMPLE_TEXTS, hla, scenario, diseases)
+        single = [annotator.enhanced_classify(text, hla, scenario, disease) for text in SAMPLE_TEXTS]
+        assert list(batch.itertuples(index=False, name=None)) == single
+    
+    def test_hyperscan_matches_re(self, annotator):
+        """Test that the optional Hyperscan path gives the same labels as re."""
+        pytest.importorskip("hyperscan")
+        hla, scenario, disease = repo_patterns(annotator)
+        if hasattr(annotator, 'order_diseases'):
+            diseases = annotator.order_diseases(disease)
+            db = annotator.build_disease_db(diseases)
+        else:
+            diseases = disease
+            db = annotator.build_pattern_db(scenario, disease)
+        assert db is not None
+        expected = annotator.classify_batch(SAMPLE_TEXTS, hla, scenario, diseases)
+        pd.testing.assert_frame_equal(annotator.classify_batch(SAMPLE_TEXTS, hla, scenario, diseases, db), expected)
+
+class TestHyperscanDisease:
+    """Test that the Hyperscan disease scan agrees with the re path."""
+    
+    @pytest.fixture
+    def disease_patterns(self):
+        """Ordered disease patterns from diseases.yml."""
+        import annotate_fixed
+        return annotate_fixed.order_diseases(repo_patterns(annotate_fixed)[2])
+    
+    def test_non_ascii_text(self, disease_patterns):
+        """Word boundaries next to non-ASCII letters must behave as in re."""
+        pytest.importorskip("hyperscan")
+        import annotate_fixed
+        disease_db = annotate_fixed.build_disease_db(disease_patterns)
+        assert disease_db is not None
+        
+        texts = pd.Series([
+            'émultiple sclerosis study',
+            'rheumatoid arthritisß',
+            'multiple sclerosis',
+            'ümelanoma and breast cancer',
+            'café melanoma',
+            'naïve t cells, hepatitis b',
+            '',
+        ])
+        expected = annotate_fixed.classify_batch(texts, {}, {}, disease_patterns)
+        actual = annotate_fixed.classify_batch(texts, {}, {}, disease_patterns, disease_db)
+        assert actual['Disease'].tolist() == expected['Disease'].tolist()
+        assert expected['Disease'].tolist()[:3] == ['Unspecified', 'Unspecified', 'Multiple Sclerosis']
+
+    def test_production_non_ascii_text(self):
+        """Word boundaries next to non-ASCII letters must behave as in re in the production scan."""
+        pytest.importorskip("hyperscan")
+        import re
+        import annotate_production
+        scenarios = {'Autoimmune': re.compile(r'\b(multiple sclerosis)\b'), 'Cancer': re.compile(r'\w*cancer\w*')}
+        diseases = {'Melanoma': re.compile(r'\b(melanoma)\b'), 'Cancer': re.compile(r'(cancer)')}
+        pattern_db = annotate_production.build_pattern_db(scenarios, diseases)
+        assert pattern_db is not None
+        
+        texts = pd.Series(['émultiple sclerosis study', 'ümelanoma', 'melanoma', 'cancerß', 'ßcancer'])
+        expected = annotate_production.classify_batch(texts, {}, scenarios, diseases)
+        actual = annotate_production.classify_batch(texts, {}, scenarios, diseases, pattern_db)
+        pd.testing.assert_frame_equal(actual, expected)
+
+class TestPatternCache:
+    """Test the pickled compiled-pattern cache."""
+    
+    def test_yaml_change_invalidates_pickle(self, tmp_path, monkeypatch):
+        """Test that an edited YAML is reloaded even if its mtime moved backwards."""
+        import annotation_utils
+        monkeypatch.setattr(annotation_utils, 'PATTERN_CACHE_DIR', tmp_path)
+        yaml_path = tmp_path / 'scenarios.yml'
+        yaml_path.write_text('Cancer: "(cancer)"\n')
+        os.utime(yaml_path, ns=(1_000_000_000, 1_000_000_000))
+        assert list(annotation_utils.load_compiled(yaml_path)) == ['Cancer']
+        assert list(annotation_utils.load_compiled(yaml_path)) == ['Cancer']
+        
+        # e.g. restored from a backup or checked out with an older timestamp
+        yaml_path.write_text('Cancer: "(cancer)"\nNormal: "(healthy)"\n')
+        os.utime(yaml_path, ns=(500_000_000, 500_000_000))
+        assert list(annotation_utils.load_compiled(yaml_path)) == ['Cancer', 'Normal']
+
+class FakeResponse:
+    """Minimal stand-in for a PRIDE API response."""
+    
+    def __init__(self, payload, status_code=200):
+        self.content = json.dumps(payload).encode()
+        self.status_code = status_code
+    
+    def raise_for_status(self):
+        pass
+
+class TestProjectCache:
+    """Test the on-disk PRIDE project cache."""
+    
+    @pytest.fixture
+    def requests_made(self):
+        """URLs requested from the fake PRIDE API."""
+        return []
+    
+    @pytest.fixture
+    def fixed(self, tmp_path, monkeypatch, requests_made):
+        """annotate_fixed with its cache in tmp_path and a fake PRIDE API."""
+        import annotate_fixed
+        monkeypatch.setattr(annotate_fixed, 'CACHE', ProjectCache(tmp_path / 'pride_projects.sqlite'))
+        monkeypatch.setattr(annotate_fixed.SESSION, 'get',
+                            lambda url, **kwargs: requests_made.append(url) or FakeResponse({'projectTitle': url}))
+        yield annotate_fixed
+        annotate_fixed.CACHE.close()
+    
+    def test_cache_hit(self, fixed, requests_made):
+        """Test that a cached project is not fetched again."""
+        first = fixed.fetch_project_only('PXD000001')
+        assert fixed.fetch_project_only('PXD000001') == first
+        assert len(requests_made) == 1
+    
+    def test_corrupt_cache_is_miss(self, fixed, requests_made):
+        """Test that an unreadable cache file falls back to fetching."""
+        fixed.CACHE.path.write_bytes(b'not a database' * 100)
+        assert fixed.fetch_project_only('PXD000001')['projectTitle'].endswith('PXD000001')
+        assert len(requests_made) == 1
+
+class TestResume:
+    """Test that an interrupted annotate_fixed run can be resumed."""
+    
+    META = (
+        "all_accession\tHLA(I/II)\t分析场景\t疾病类型\n"
+        "PXD000001\tI\tCancer\tMelanoma\n"
+        "MSV000080527\tI\tNormal\t\n"
+        "PXD000002\tII\tInfection\tCOVID-19\n"
+        "PXD000003\tI\tCancer\tCancer\n"
+        "PXD000004\tI\tNormal\tCell Line/Reference\n"
+    )
+    
+    TITLES = {
+        'PXD000001': 'HLA class I peptides from melanoma tumor tissue',
+        'PXD000002': 'MHC class II ligands in COVID-19 patients',
+        'PXD000003': 'breast cancer immunopeptidome',
+    }
+    
+    @pytest.fixture
+    def fixed(self, tmp_path, monkeypatch):
+        """annotate_fixed running in tmp_path against a fake PRIDE API, two accessions per chunk."""
+        import annotate_fixed
+        import shutil
+        for name in ('hla_patterns.yml', 'scenarios.yml', 'diseases.yml'):
+            shutil.copy(os.path.join(REPO_DIR, name), tmp_path)
+        (tmp_path / 'meta.txt').write_text(self.META, encoding='utf-8')
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(annotate_fixed, 'CACHE', ProjectCache(tmp_path / 'pride_projects.sqlite'))
+        monkeypatch.setattr(annotate_fixed, 'CHUNK_SIZE', 2)
+        monkeypatch.setattr(annotate_fixed.SESSION, 'get', lambda url, **kwargs: FakeResponse(
+            {'projectTitle': self.TITLES.get(url.rsplit('/', 1)[-1], 'plasma proteome')}))
+        yield annotate_fixed
+        annotate_fixed.CACHE.close()
+    
+    def test_missing_meta_value_is_empty(self, fixed):
+        """Test that a blank meta.txt value is written as an empty field, not nan."""
+        fixed.main()
+        with open(fixed.OUTPUT_FILE, encoding='utf-8') as f:
+            assert "MSV000080527\tI\tNormal\t\n" in f.readlines()
+    
+    @pytest.mark.parametrize('cut_mid_row', [False, True])
+    def test_resume_reproduces_full_run(self, fixed, cut_mid_row):
+        """Test that resuming a truncated output file gives the same file as a full run."""
+        fixed.main()
+        with open(fixed.OUTPUT_FILE, encoding='utf-8') as f:
+            full = f.read()
+        
+        lines = full.splitlines(keepends=True)
+        assert len(lines) == 6
+        with open(fixed.OUTPUT_FILE, 'w', encoding='utf-8') as f:
+            f.writelines(lines[:3])
+            if cut_mid_row:
+                # A crash while writing the next row leaves it without its newline
+                f.write(lines[3][:-5])
+        
+        fixed.main(resume=True)
+        with open(fixed.OUTPUT_FILE, encoding='utf-8') as f:
+            assert f.read() == full
+
+class TestProductionMain:
+    """Test an annotate_production run end to end against a fake PRIDE API."""
+    
+    META = (
+        "all_accession\tHLA(I/II)\t分析场景\t疾病类型\n"
+        "PXD000001\tI\tCancer\tMelanoma\n"
+        "PXD000002\tII\tInfection\tCOVID-19\n"
+        "\tI\tNormal\tCancer\n"
+        "PXD000001\tI\tCancer\tMelanoma\n"
+        "PXD000003\tI\tNormal\tCell Line/Reference\n"
+    )
+    
+    TITLES = {
+        'PXD000001': 'HLA class I peptides from melanoma tumor tissue',
+        'PXD000003': 'plasma proteome',
+    }
+    
+    @pytest.fixture
+    def requests_made(self):
+        """URLs requested from the fake PRIDE API."""
+        return []
+    
+    @pytest.fixture
+    def production(self, tmp_path, monkeypatch, requests_made):
+        """annotate_production running in tmp_path; PXD000002 is missing from both API versions."""
+        import annotate_production
+        import shutil
+        for name in ('hla_patterns.yml', 'scenarios.yml', 'diseases.yml'):
+            shutil.copy(os.path.join(REPO_DIR, name), tmp_path)
+        (tmp_path / 'meta.txt').write_text(self.META, encoding='utf-8')
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(annotate_production, 'CACHE', ProjectCache(tmp_path / 'pride_projects_v3.sqlite'))
+        
+        def fake_get(url, **kwargs):
+            requests_made.append(url)
+            title = self.TITLES.get(url.rsplit('/', 1)[-1])
+            return FakeResponse({'projectTitle': title}, status_code=200 if title else 404)
+        
+        monkeypatch.setattr(annotate_production.SESSION, 'get', fake_get)
+        yield annotate_production
+        annotate_production.CACHE.close()
+    
+    def test_main(self, production, requests_made):
+        """Test a blank accession, a failed fetch and a duplicated accession in one run."""
+        production.main()
+        results = pd.read_csv('dataset_annotation.tsv', sep='\t')
+        assert len(results) == 5
+        
+        # The duplicated accession is fetched once and both rows get its labels
+        assert sum(url.endswith('/PXD000001') for url in requests_made) == 1
+        first, duplicate = results.iloc[0], results.iloc[3]
+        assert first['all_accession'] == duplicate['all_accession'] == 'PXD000001'
+        assert tuple(first.iloc[1:]) == tuple(duplicate.iloc[1:]) == ('I', 'Mixed', 'Melanoma')
+        
+        # A failed fetch falls back to meta.txt
+        assert tuple(results.iloc[1]) == ('PXD000002', 'II', 'Infection', 'COVID-19')
+        
+        # A blank accession is logged as an error and written as Unspecified
+        assert pd.isna(results.iloc[2]['all_accession'])
+        assert tuple(results.iloc[2].iloc[1:]) == ('Unspecified',) * 3
+        
+        # Only the unspecified project goes to manual review, not the failed row
+        manual = pd.read_csv('needs_manual.csv')
+        assert manual['all_accession'].tolist() == ['PXD000003']
+
 if __name__ == "__main__":
-    pytest.main([__file__, "-v"])
\ No newline at end of file
+    pytest.main([__file__, "-v"])